@@ -9,6 +9,7 @@ ordenar_xml.py
 4) Emit:
    • cleaned, sorted XML → output_file.xml
    • rich HTML report → output_file.html
+     (--include-raw also embeds each page's raw XML)
 """
 
 import argparse
@@ -16,11 +17,14 @@ import sys
 import re
 import html
 from pathlib import Path
-import xml.etree.ElementTree as ET
 from datetime import datetime
 
+import xml_index
+from xml_index import ET, child, child_text
+
 # Patterns to detect sensitive data and URLs
 IP_RE = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")
+SENSITIVE_NAME_RE = re.compile(r"password", re.IGNORECASE)
 URL_RE = re.compile(r"https?://[^\s<>\]]+")
 
 
@@ -36,64 +40,120 @@ def parse_args():
         default="id",
         help="Clave de orden: 'id', 'title' o 'creationDate'"
     )
+    parser.add_argument(
+        "--include-raw",
+        action="store_true",
+        help="Incluir el XML crudo de cada página en el reporte HTML (más lento y pesado)"
+    )
     return parser.parse_args()
 
 
-def strip_ns(elem):
-    for e in elem.iter():
-        if isinstance(e.tag, str) and '}' in e.tag:
-            e.tag = e.tag.split('}', 1)[1]
-    return elem
-
-
-def remove_sensitive(obj):
-    for p in list(obj.findall('.//property')):
-        name = (p.get('name') or '').lower()
-        text_all = ''.join(p.itertext())
-        if 'password' in name or IP_RE.search(text_all):
-            parent = next((pr for pr in obj.iter() if p in pr), None)
-            if parent:
-                parent.remove(p)
-    for attr in list(obj.attrib):
-        if 'password' in attr.lower() or IP_RE.search(obj.attrib[attr]):
-            del obj.attrib[attr]
-
-
-def promote_title(obj):
-    prop = obj.find('./property[@name="title"]')
-    if not prop:
-        return
-    title_el = ET.Element('title')
-    title_el.text = (prop.text or '').strip()
-    obj.insert(0, title_el)
+def _is_sensitive(p):
+    if SENSITIVE_NAME_RE.search(p.get('name') or ''):
+        return True
+    # Only nested properties need the full subtree text; an IP needs a dot
+    text = ''.join(p.itertext()) if len(p) else (p.text or '')
+    return '.' in text and IP_RE.search(text) is not None
+
+
+def _scrub(parent):
+    # Preorder walk that removes matches from their known parent (O(n)).
+    for p in list(parent):
+        if p.tag == 'property' and _is_sensitive(p):
+            parent.remove(p)
+        else:
+            _scrub(p)
+
+
+def promote_title(obj, prop):
+    # Rename in place rather than allocating a new <title> element
+    prop.tag = 'title'
+    prop.attrib.clear()
+    prop.text = (prop.text or '').strip()
     obj.remove(prop)
+    obj.insert(0, prop)
+    return prop.text
+
+
+def process_page(obj):
+    """Scrub, promote the title and bucket a Page's children in one walk.
+
+    Returns the fields used by the sort key and the HTML report, so neither
+    has to query the tree again. Confluence keeps an object's properties
+    as direct children.
+    """
+    page = {
+        'element': obj, 'title': None, 'lowerTitle': None, 'id': None,
+        'creationDate': None, 'bodyContents': None,
+        'properties': [], 'collections': [],
+    }
+    title_prop = None
+    for c in list(obj):
+        tag = c.tag
+        if tag == 'property':
+            if _is_sensitive(c):
+                obj.remove(c)
+                continue
+            _scrub(c)
+            name = c.get('name')
+            if name == 'title' and title_prop is None:
+                title_prop = c
+                continue
+            if name == 'lowerTitle' and page['lowerTitle'] is None:
+                page['lowerTitle'] = c.text or ''
+            elif name == 'creationDate' and page['creationDate'] is None:
+                page['creationDate'] = c.text or ''
+            page['properties'].append(c)
+        elif tag == 'collection':
+            _scrub(c)
+            if c.get('name') == 'bodyContents' and page['bodyContents'] is None:
+                page['bodyContents'] = c
+            page['collections'].append(c)
+        else:
+            if tag == 'id' and page['id'] is None and c.get('name') == 'id':
+                page['id'] = c.text or ''
+            _scrub(c)
+    # Rebuild once instead of deleting keys one by one (lxml's attrib can't be reassigned)
+    attrib = obj.attrib
+    kept = {k: v for k, v in attrib.items()
+            if not (SENSITIVE_NAME_RE.search(k) or ('.' in v and IP_RE.search(v)))}
+    if len(kept) != len(attrib):
+        attrib.clear()
+        attrib.update(kept)
+    if title_prop is not None:
+        page['title'] = promote_title(obj, title_prop)
+    return page
 
 
 def get_sort_key(mode):
     if mode == 'id':
-        return lambda o: int(o.findtext('id[@name="id"]', default='0') or 0)
+        return lambda p: int(p['id'] or 0)
     if mode == 'title':
-        return lambda o: (o.findtext('title', default='') or '').lower()
+        return lambda p: (p['title'] or '').lower()
     if mode == 'creationDate':
-        def key_fn(o):
-            s = o.findtext('property[@name="creationDate"]', default='')
+        def key_fn(p):
+            s = p['creationDate'] or ''
             try:
                 return datetime.strptime(s[:19], '%Y-%m-%d %H:%M:%S')
             except ValueError:
                 return datetime.min
         return key_fn
-    return lambda o: 0
+    return lambda p: 0
 
 
 def linkify(text):
-    parts = URL_RE.split(text)
-    urls = URL_RE.findall(text)
+    # Every URL_RE match starts with "http"; skip the regex for plain text
+    if 'http' not in text:
+        return html.escape(text)
+    esc = html.escape
     out = []
-    for i, part in enumerate(parts):
-        out.append(html.escape(part))
-        if i < len(urls):
-            u = html.escape(urls[i])
-            out.append(f'<a href="{u}" target="_blank">{u}</a>')
+    pos = 0
+    for m in URL_RE.finditer(text):
+        out.append(esc(text[pos:m.start()]))
+        u = esc(m.group())
+        out.append(f'<a href="{u}" target="_blank">{u}</a>')
+        pos = m.end()
+    out.append(esc(text[pos:]))
     return ''.join(out)
 
 
@@ -111,89 +171,100 @@ def write_sorted_xml(tree, root, pages, out_xml):
     tree.write(out_xml, encoding='utf-8', xml_declaration=True)
 
 
-def write_html_report(pages, body_map, out_html):
-    lines = [
-        '<!DOCTYPE html>',
-        '<html><head><meta charset="utf-8"><title>Reporte de Páginas</title>',
-        '<style>',
-        'body{font:14px sans-serif;margin:1em;}',
-        'section{border:1px solid #ccc;padding:1em;margin:1em 0;}',
-        '.label{font-weight:bold;margin-top:0.5em;display:block;}',
-        '.body-content-block{border:1px dashed #999;padding:0.5em;margin:0.5em 0;}',
-        '.body-content-block h4{margin:0.2em 0;}',
-        'pre{background:#f8f8f8;padding:0.5em;overflow:auto;}',
-        'details{margin-top:0.5em;}','summary{cursor:pointer;font-weight:bold;}',
-        '</style></head><body>',
-        f'<h1>Páginas ({len(pages)})</h1>'
-    ]
-    for o in pages:
-        lines.append('<section>')
-        # Determine title or fallback
-        title = o.findtext('title')
-        if title:
-            title = title.strip()
-        else:
-            title = o.findtext('property[@name="lowerTitle"]', default='').strip()
-        if not title:
-            title = '(sin título)'
-        lines.append(f'<h2>{html.escape(title)}</h2>')
-        # ID and creation date
-        if (idv := o.findtext('id[@name="id"]')):
-            lines.append(f'<p><span class="label">ID:</span> {html.escape(idv)}</p>')
-        if (cd := o.findtext('property[@name="creationDate"]')):
-            lines.append(f'<p><span class="label">Fecha creación:</span> {html.escape(cd)}</p>')
-
-        # Body content sections
-        bc = o.find('.//collection[@name="bodyContents"]')
-        if bc is not None:
-            lines.append('<h3 class="label">Body Content</h3>')
-            for elem in bc.findall('element'):
-                bc_id = elem.findtext('id[@name="id"]')
-                bc_obj = body_map.get(bc_id)
-                if bc_obj is not None:
-                    body_prop = bc_obj.find('property[@name="body"]')
+def render_body(body_prop):
+    """Escaped raw XML and rendered HTML of a BodyContent body."""
+    raw = html.escape(ET.tostring(body_prop, encoding='unicode'))
+    if len(body_prop):
+        content = ''.join(ET.tostring(c, encoding='unicode', method='html') for c in body_prop)
+    else:
+        content = html.escape(body_prop.text or '')
+    return raw, content
+
+
+def write_html_report(pages, body_map, out_html, include_raw=False):
+    esc = html.escape  # local alias for the per-page loop
+    # Stream straight to disk so only the current section is held in memory
+    with Path(out_html).open('w', encoding='utf-8', buffering=1 << 20) as fp:
+        w = fp.write
+        w('<!DOCTYPE html>\n'
+          '<html><head><meta charset="utf-8"><title>Reporte de Páginas</title>\n'
+          '<style>\n'
+          'body{font:14px sans-serif;margin:1em;}\n'
+          'section{border:1px solid #ccc;padding:1em;margin:1em 0;}\n'
+          '.label{font-weight:bold;margin-top:0.5em;display:block;}\n'
+          '.body-content-block{border:1px dashed #999;padding:0.5em;margin:0.5em 0;}\n'
+          '.body-content-block h4{margin:0.2em 0;}\n'
+          'pre{background:#f8f8f8;padding:0.5em;overflow:auto;}\n'
+          'details{margin-top:0.5em;}\nsummary{cursor:pointer;font-weight:bold;}\n'
+          '</style></head><body>\n')
+        w(f'<h1>Páginas ({len(pages)})</h1>\n')
+        for page in pages:
+            o = page['element']
+            w('<section>\n')
+            # Determine title or fallback
+            title = page['title']
+            if title:
+                title = title.strip()
+            else:
+                title = (page['lowerTitle'] or '').strip()
+            if not title:
+                title = '(sin título)'
+            w('<h2>'); w(esc(title)); w('</h2>\n')
+            # ID and creation date
+            if (idv := page['id']):
+                w('<p><span class="label">ID:</span> '); w(esc(idv)); w('</p>\n')
+            if (cd := page['creationDate']):
+                w('<p><span class="label">Fecha creación:</span> '); w(esc(cd)); w('</p>\n')
+
+            # Body content sections
+            bc = page['bodyContents']
+            if bc is not None:
+                w('<h3 class="label">Body Content</h3>\n')
+                for elem in [c for c in bc if c.tag == 'element']:
+                    bc_id = child_text(elem, 'id', 'id')
+                    bc_obj = body_map.get(bc_id)
+                    body_prop = None if bc_obj is None else child(bc_obj, 'property', 'body')
                     if body_prop is not None:
-                        lines.append('<div class="body-content-block">')
-                        lines.append(f'<h4>Entry ID: {html.escape(bc_id)}</h4>')
-                        raw = ET.tostring(body_prop, encoding='unicode')
-                        lines.append('<details><summary>Raw body</summary>')
-                        lines.append(f'<pre>{html.escape(raw)}</pre></details>' )
-                        content = ''.join(ET.tostring(c, encoding='unicode', method='html') for c in body_prop)
-                        if not content:
-                            content = html.escape(body_prop.text or '')
-                        lines.append('<details open><summary>Rendered body</summary>')
-                        lines.append(f'<div style="white-space:pre-wrap;margin-left:1em;">{content}</div>')
-                        lines.append('</details>')
-                        lines.append('</div>')
-
-        # Other properties
-        skip = {'title','creationdate','lowertitle','body'}
-        for prop in o.findall('property'):
-            nm = prop.get('name','')
-            if nm.lower() in skip:
-                continue
-            txt = ''.join(prop.itertext()).strip()
-            if txt:
-                lines.append(f'<p><span class="label">{html.escape(nm)}:</span> {linkify(txt)}</p>')
-
-        # Other collections
-        for coll in o.findall('collection'):
-            nm = coll.get('name','')
-            if nm == 'bodyContents':
-                continue
-            lines.append(f'<p><span class="label">Colección: {html.escape(nm)}</span></p><ul>')
-            for el in coll.findall('element'):
-                lines.append(f'<li>{serialize_children(el)}</li>')
-            lines.append('</ul>')
-
-        # Raw object XML
-        rawobj = ET.tostring(o, encoding='unicode')
-        lines.append('<details><summary>XML crudo de la sección</summary>')
-        lines.append(f'<pre>{html.escape(rawobj)}</pre>')
-        lines.append('</details></section>')
-
-    lines.append('</body></html>')
-    Path(out_html).write_text('\n'.join(lines), encoding='utf-8')
+                        raw, content = render_body(body_prop)
+                        w('<div class="body-content-block">\n')
+                        w('<h4>Entry ID: '); w(esc(bc_id)); w('</h4>\n')
+                        w('<details><summary>Raw body</summary>\n')
+                        w('<pre>'); w(raw); w('</pre></details>\n')
+                        w('<details open><summary>Rendered body</summary>\n')
+                        w('<div style="white-space:pre-wrap;margin-left:1em;">'); w(content); w('</div>\n')
+                        w('</details>\n')
+                        w('</div>\n')
+
+            # Other properties
+            skip = {'title','creationdate','lowertitle','body'}
+            for prop in page['properties']:
+                nm = prop.get('name','')
+                if nm.lower() in skip:
+                    continue
+                txt = ''.join(prop.itertext()).strip()
+                if txt:
+                    w('<p><span class="label">'); w(esc(nm)); w(':</span> ')
+                    w(linkify(txt)); w('</p>\n')
+
+            # Other collections
+            for coll in page['collections']:
+                nm = coll.get('name','')
+                if nm == 'bodyContents':
+                    continue
+                w('<p><span class="label">Colección: '); w(esc(nm)); w('</span></p><ul>\n')
+                for el in [c for c in coll if c.tag == 'element']:
+                    w('<li>'); w(serialize_children(el)); w('</li>\n')
+                w('</ul>\n')
+
+            # Raw object XML (opt-in: re-serializes the whole page)
+            if include_raw:
+                rawobj = ET.tostring(o, encoding='unicode')
+                w('<details><summary>XML crudo de la sección</summary>\n')
+                w('<pre>'); w(esc(rawobj)); w('</pre>\n')
+                w('</details>')
+            w('</section>\n')
+
+        w('</body></html>')
 
 
 def main():
@@ -201,27 +272,23 @@ def main():
     inp = Path(args.input_file)
     base = Path(args.output_base)
     try:
-        tree = ET.parse(inp)
+        root, pages, body_map = xml_index.load(inp)
     except Exception as e:
         print(f"[ERROR] Failed parsing {{inp}}: {{e}}", file=sys.stderr)
         sys.exit(1)
-    root = strip_ns(tree.getroot())
-
-    pages = root.findall('.//object[@class="Page"]')
-    body_objs = root.findall('.//object[@class="BodyContent"]')
-    body_map = {bo.findtext('id[@name="id"]'): bo for bo in body_objs}
 
-    for p in pages:
-        remove_sensitive(p)
-        promote_title(p)
-    pages.sort(key=get_sort_key(args.key))
+    pages = [process_page(p) for p in pages]
+    key_fn = get_sort_key(args.key)
+    keys = [key_fn(p) for p in pages]
+    order = sorted(range(len(pages)), key=keys.__getitem__)
+    pages = [pages[i] for i in order]
 
     out_xml = base.with_suffix('.xml')
-    write_sorted_xml(tree, root, pages, out_xml)
+    write_sorted_xml(ET.ElementTree(root), root, [p['element'] for p in pages], out_xml)
     print(f"[OK] XML ordenado → {out_xml}")
 
     out_html = base.with_suffix('.html')
-    write_html_report(pages, body_map, out_html)
+    write_html_report(pages, body_map, out_html, args.include_raw)
     print(f"[OK] HTML generado → {out_html}")
 
 if __name__ == '__main__':
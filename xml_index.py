@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+xml_index.py
+
+Shared parse step for Confluence XML exports:
+one iterparse pass that strips namespaces and indexes
+<object class="Page"> and <object class="BodyContent"> by id.
+"""
+
+# Prefer lxml (libxml2 parser/serializer); fall back to the stdlib ElementTree
+try:
+    from lxml import etree as ET
+    LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    LXML = False
+
+
+def child(obj, tag, name):
+    """First direct child <tag name="name">, without ElementPath."""
+    for c in obj:
+        if c.tag == tag and c.get('name') == name:
+            return c
+    return None
+
+
+def child_text(obj, tag, name, default=None):
+    c = child(obj, tag, name)
+    return default if c is None else (c.text or '')
+
+
+def load(path):
+    """Return (root, pages, body_map) for *path*, freshly parsed on every call.
+
+    Other objects are kept in the tree (not cleared) because the sorted XML
+    output re-emits the whole document.
+    """
+    pages = []
+    body_map = {}
+    # libxml2 rejects text nodes over 10 MB unless huge_tree is set
+    extra = {'huge_tree': True} if LXML else {}
+    it = ET.iterparse(str(path), events=('end',), **extra)
+    for _, elem in it:
+        tag = elem.tag
+        if not isinstance(tag, str):
+            continue
+        if '}' in tag:
+            tag = elem.tag = tag.split('}', 1)[1]
+        if tag == 'object':
+            cls = elem.get('class')
+            if cls == 'Page':
+                pages.append(elem)
+            elif cls == 'BodyContent':
+                body_map[child_text(elem, 'id', 'id')] = elem
+    if LXML:
+        # Renaming tags leaves the xmlns declarations behind on lxml
+        ET.cleanup_namespaces(it.root)
+    return it.root, pages, body_map